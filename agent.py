@@ -201,9 +201,18 @@ class ImageAnalysisAgent:
                 tools=self.tools
             )
             
-            # 处理模型响应
-            if 'message' in response and 'tool_calls' in response['message']:
-                return self.execute_tool(response['message']['tool_calls'][0])
+            # 处理模型响应（llm_chat 返回流式生成器，工具调用在字典类型的 chunk 中）
+            tool_call = None
+            for chunk in response:
+                if isinstance(chunk, dict):
+                    if 'message' in chunk and 'tool_calls' in chunk['message']:
+                        tool_call = chunk['message']['tool_calls'][0]
+                    elif chunk.get('status') == 'error':
+                        return chunk
+            
+            # 读完流、结束本次模型调用后再执行工具
+            if tool_call:
+                return self.execute_tool(tool_call)
             
             return {
                 "status": "error",
@@ -2,20 +2,60 @@ from openai import OpenAI
 from models.language_model import LanguageModel
 from models.vision_model import VisionModel
 from typing import Union, Dict, Generator
+import os
+import threading
+import weakref
 
 class APIClient:
     def __init__(self):
         self.client = OpenAI(
             api_key="your api key",
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+            base_url=os.environ.get("MODEL_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
         )
         self.language_model = LanguageModel(self.client)
         self.vision_model = VisionModel(self.client)
+        self.in_flight = 0
+        self._message_builders = weakref.WeakSet()
+        self._lock = threading.Lock()
     
-    def llm_chat(self, messages: list, tools: list = None) -> Union[Dict, Generator[str, None, None]]:
+    def _track(self, generator: Generator) -> Generator:
+        """统计进行中的模型调用数"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield from generator
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+    
+    def llm_chat(self, messages: list, tools: list = None, tool_choice: str = None,
+                 message_builder=None) -> Union[Dict, Generator[str, None, None]]:
         """语言模型对话"""
-        return self.language_model.chat(messages, tools)
+        return self._track(self.language_model.chat(messages, tools, tool_choice, message_builder))
+    
+    def new_message_builder(self):
+        """创建会话级消息构建器"""
+        builder = self.language_model.new_message_builder()
+        with self._lock:
+            self._message_builders.add(builder)
+        return builder
+    
+    def prompt_cache_stats(self) -> Dict:
+        """汇总存活会话的前缀缓存命中统计"""
+        with self._lock:
+            builders = list(self._message_builders)
+        stats = {"sessions": len(builders), "calls": 0, "input_tokens": 0, "cached_tokens": 0, "prefix_changes": 0}
+        for builder in builders:
+            builder_stats = builder.get_stats()
+            for key in ("calls", "input_tokens", "cached_tokens", "prefix_changes"):
+                stats[key] += builder_stats[key]
+        stats["prefix_hit_rate"] = stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+        return stats
+    
+    def image_cache_stats(self) -> Dict:
+        """图片编码缓存统计"""
+        return self.vision_model.image_cache.get_stats()
     
     def sendPicture(self, image_path: str):
         """视觉模型分析图片"""
-        return self.vision_model.chat([], image_path)
+        return self._track(self.vision_model.chat([], image_path))
@@ -0,0 +1,181 @@
+"""对比原先的字典对话历史与紧凑对话历史的空闲内存占用和每轮序列化耗时
+
+用法: python3 benchmark_conversation.py [会话数] [每个会话的轮数]
+"""
+import sys
+import time
+import tracemalloc
+
+from models.conversation import Conversation
+from models.message_builder import MessageBuilder
+from serving import WireCacheLRU
+
+SYSTEM_PROMPT = "You are a helpful AI assistant. Answer in Chinese."
+USER_TEXT = "请帮我看看这张图片里有什么 pictures/test.png"
+ASSISTANT_TEXT = "这张图片展示了一只在草地上奔跑的小狗，背景是蓝天和白云。" * 4
+TOOL_PARTS = ["图片中", "有一只", "棕色的", "小狗", "正在", "草地上", "奔跑。"] * 20
+
+
+def dict_format_messages(messages):
+    """原先 BaseModel.format_messages 的实现，每次调用都重建全部消息"""
+    system_message = {
+        "role": "system",
+        "content": [{"type": "text", "text": SYSTEM_PROMPT}]
+    }
+    formatted_messages = []
+    for msg in messages:
+        formatted_messages.append({
+            "role": msg["role"],
+            "content": [{"type": "text", "text": msg["content"]}]
+        })
+    return [system_message] + formatted_messages
+
+
+def fresh(text):
+    """生成新的字符串对象，模拟从网络收到的消息"""
+    return (text + " ")[:-1]
+
+
+FOLLOW_UP = {'role': 'user', 'content': '基于这个结果，你有什么补充说明的吗？'}
+
+
+def fill_dict_session(history, turns):
+    """按原先的方式填充对话历史，每轮序列化两次（主调用 + 补充说明）"""
+    for _ in range(turns):
+        history.append({'role': 'user', 'content': fresh(USER_TEXT)})
+        dict_format_messages(history)
+        history.append({'role': 'assistant', 'content': "".join(fresh(part) for part in TOOL_PARTS)})
+        dict_format_messages(history + [FOLLOW_UP])
+        history.append({'role': 'assistant', 'content': fresh(ASSISTANT_TEXT)})
+
+
+class CompactSession:
+    """与 ChatSession 相同的存储结构：对话历史 + 会话级消息构建器"""
+    def __init__(self):
+        self.conversation = Conversation()
+        self.message_builder = MessageBuilder(SYSTEM_PROMPT)
+
+    def release_wire(self):
+        self.message_builder.release()
+        self.conversation.release_wire()
+
+
+def fill_compact_session(session, turns):
+    """按 ChatSession 的方式填充对话历史：每轮两次调用，格式化缓存跨轮次保留"""
+    conversation, builder = session.conversation, session.message_builder
+    for _ in range(turns):
+        conversation.append('user', fresh(USER_TEXT))
+        builder.build(conversation.messages)
+        conversation.append('assistant', [fresh(part) for part in TOOL_PARTS])
+        builder.build(conversation.messages + [FOLLOW_UP])
+        conversation.append('assistant', fresh(ASSISTANT_TEXT))
+
+
+def measure_memory(factory, sessions, release=None):
+    """测量若干会话在两轮对话之间占用的内存（字节）；给出 release 时同时测量释放缓存后的占用"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [factory() for _ in range(sessions)]
+    active = tracemalloc.take_snapshot()
+    idle = None
+    if release is not None:
+        release(kept)
+        idle = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    active_size = sum(stat.size_diff for stat in active.compare_to(before, 'filename'))
+    idle_size = sum(stat.size_diff for stat in idle.compare_to(before, 'filename')) if idle else None
+    return active_size, idle_size
+
+
+def measure_serialization(turns):
+    """测量每轮对话两次序列化（主调用 + 补充说明）的耗时（秒），不含追加消息本身"""
+    history = []
+    dict_times = []
+    for _ in range(turns):
+        elapsed = 0.0
+        history.append({'role': 'user', 'content': fresh(USER_TEXT)})
+        started_at = time.perf_counter()
+        dict_format_messages(history)
+        elapsed += time.perf_counter() - started_at
+        history.append({'role': 'assistant', 'content': "".join(fresh(part) for part in TOOL_PARTS)})
+        started_at = time.perf_counter()
+        dict_format_messages(history + [FOLLOW_UP])
+        elapsed += time.perf_counter() - started_at
+        history.append({'role': 'assistant', 'content': fresh(ASSISTANT_TEXT)})
+        dict_times.append(elapsed)
+
+    session = CompactSession()
+    conversation, builder = session.conversation, session.message_builder
+    compact_times = []
+    for _ in range(turns):
+        elapsed = 0.0
+        conversation.append('user', fresh(USER_TEXT))
+        started_at = time.perf_counter()
+        builder.build(conversation.messages)
+        elapsed += time.perf_counter() - started_at
+        conversation.append('assistant', [fresh(part) for part in TOOL_PARTS])
+        started_at = time.perf_counter()
+        builder.build(conversation.messages + [FOLLOW_UP])
+        elapsed += time.perf_counter() - started_at
+        conversation.append('assistant', fresh(ASSISTANT_TEXT))
+        compact_times.append(elapsed)
+
+    return dict_times, compact_times
+
+
+def run_benchmark(sessions: int, turns: int):
+    """运行对比测试"""
+    def make_dict_session():
+        history = []
+        fill_dict_session(history, turns)
+        return history
+
+    def make_compact_session():
+        session = CompactSession()
+        fill_compact_session(session, turns)
+        return session
+
+    def release_idle(kept):
+        # 会话空闲后被 LRU 挤出活跃集合，释放格式化缓存
+        lru = WireCacheLRU(max_active=0)
+        for session in kept:
+            lru.touch(session)
+
+    dict_size, _ = measure_memory(make_dict_session, sessions)
+    active_size, idle_size = measure_memory(make_compact_session, sessions, release_idle)
+
+    per_1k = 1000 / sessions
+    mib = per_1k / 1024 / 1024
+    print(f"sessions: {sessions}, turns per session: {turns}, messages per session: {turns * 3}")
+    print(f"dict layout memory per 1k sessions:            {dict_size * mib:.2f} MiB")
+    print(f"compact layout, active (caches kept):          {active_size * mib:.2f} MiB")
+    print(f"compact layout, idle (released by LRU):        {idle_size * mib:.2f} MiB")
+
+    # 格式化缓存跨轮次保留：每轮的主调用都应复用上一轮的全部历史
+    session = CompactSession()
+    reused = []
+    for _ in range(3):
+        fill_compact_session(session, 1)
+        reused.append(session.message_builder.calls[-2]["reused_messages"])
+    assert reused == [0, 2, 5], f"history is not reused across turns: {reused}"
+    print(f"reused messages on each turn's first call: {reused}")
+    # 前缀不变时不应标记变化，换一组 tools 后下一次调用应标记
+    builder = session.message_builder
+    assert not any(call["prefix_changed"] for call in builder.calls), "prefix flagged as changed without a change"
+    _, call = builder.build(session.conversation.messages, [{"type": "function", "function": {"name": "noop"}}])
+    assert call["prefix_changed"], call
+    print(f"prefix changes after switching tools: {builder.get_stats()['prefix_changes']}")
+
+    dict_times, compact_times = measure_serialization(turns)
+    print(f"dict layout serialization per turn, last turn:    {dict_times[-1] * 1e6:.1f} us")
+    print(f"compact layout serialization per turn, last turn: {compact_times[-1] * 1e6:.1f} us")
+    print(f"dict layout serialization per turn, mean:    {sum(dict_times) / turns * 1e6:.1f} us")
+    print(f"compact layout serialization per turn, mean: {sum(compact_times) / turns * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    run_benchmark(
+        sessions=int(args[0]) if len(args) > 0 else 1000,
+        turns=int(args[1]) if len(args) > 1 else 10
+    )
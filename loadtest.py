@@ -0,0 +1,197 @@
+"""对 web 服务做压力测试，模型服务由本地的替身服务器模拟
+
+用法: python3 loadtest.py [并发数] [请求总数] [模型延迟秒数]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+import base64
+import json
+import os
+import sys
+import threading
+import time
+
+STUB_PORT = int(os.environ.get("STUB_PORT", 18080))
+WEB_PORT = int(os.environ.get("WEB_PORT", 18000))
+
+
+VISION_REPLY = "stub-vision-analysis"
+IMAGE_MISSING_REPLY = "stub-image-missing"
+IMAGE_SIZE = 0
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def load_image(url: str) -> bytes:
+    """像真实视觉模型一样取得图片内容：data URL 直接解码，http(s) 地址回取"""
+    if url.startswith("data:"):
+        return base64.b64decode(url.split(",", 1)[1])
+    if url.startswith(("http://", "https://")):
+        with urlopen(url, timeout=10) as response:
+            return response.read()
+    return b""
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    """模拟 OpenAI 兼容的流式 chat/completions 接口
+
+    带 tools 的请求返回 analyze_image 工具调用；带图片的请求会解码或回取图片，
+    确认是完整的 PNG 后才返回固定的分析结果，
+    这样 /upload 会完整走一遍 意图识别 -> 工具调用 -> 图片编码 -> 视觉模型 的流程。
+    """
+    delay = 0.5
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.delay)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for chunk in self._reply_chunks(body):
+            chunk.update({"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub"})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _reply_chunks(self, body):
+        """根据请求内容生成流式响应"""
+        # 与真实服务一致，只有请求了 include_usage 才返回只含 usage 的 chunk
+        usage = []
+        if body.get("stream_options", {}).get("include_usage"):
+            usage = [{"choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": 1, "total_tokens": 101,
+                                               "prompt_tokens_details": {"cached_tokens": 0}}}]
+        contents = [item for msg in body.get("messages", []) for item in msg.get("content", [])
+                    if isinstance(item, dict)]
+
+        if body.get("tools") and body.get("tool_choice") != "none":
+            # 意图识别：取用户消息最后一个词作为图片地址
+            text = [item["text"] for item in contents if item.get("type") == "text"][-1]
+            arguments = json.dumps({"image_path": text.split()[-1]})
+            return [
+                {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "id": "call_stub", "type": "function",
+                    "function": {"name": "analyze_image", "arguments": ""}}]}, "finish_reason": None}]},
+                {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0,
+                    "function": {"arguments": arguments}}]}, "finish_reason": None}]},
+                {"choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]}
+            ] + usage
+
+        reply = "stub"
+        image_urls = [item["image_url"]["url"] for item in contents if item.get("type") == "image_url"]
+        if image_urls:
+            try:
+                image = load_image(image_urls[0])
+            except Exception:
+                image = b""
+            reply = VISION_REPLY if image.startswith(PNG_SIGNATURE) and len(image) == IMAGE_SIZE else IMAGE_MISSING_REPLY
+        return [
+            {"choices": [{"index": 0, "delta": {"content": reply}, "finish_reason": None}]},
+            {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        ] + usage
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(delay: float) -> ThreadingHTTPServer:
+    """启动模型替身服务器"""
+    StubModelHandler.delay = delay
+    server = ThreadingHTTPServer(('127.0.0.1', STUB_PORT), StubModelHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, p):
+    """计算百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_load_test(concurrency: int, total: int, delay: float):
+    """启动替身模型和 web 服务并发起并发请求"""
+    os.environ["MODEL_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+    stub = start_stub_server(delay)
+
+    import requests
+    from waitress.server import create_server
+    from serve import WORKER_THREADS, CONNECTION_LIMIT
+    from web import app
+
+    web_server = create_server(app, host='127.0.0.1', port=WEB_PORT,
+                               threads=WORKER_THREADS, connection_limit=CONNECTION_LIMIT)
+    threading.Thread(target=web_server.run, daemon=True).start()
+    base_url = f"http://127.0.0.1:{WEB_PORT}"
+
+    with open(os.path.join("pictures", "test.png"), "rb") as f:
+        image = f.read()
+    global IMAGE_SIZE
+    IMAGE_SIZE = len(image)
+
+    def send(i):
+        started_at = time.monotonic()
+        filename = f"loadtest_{i}.png"
+        try:
+            response = requests.post(f"{base_url}/upload", files={'file': (filename, image)}, timeout=60)
+            status = response.status_code
+            if status == 200:
+                # 200 只说明请求被处理，分析结果必须来自视觉模型才算成功
+                result = response.json()
+                data = "".join(result.get("data", []))
+                status = "ok" if result.get("status") == "success" and VISION_REPLY in data else "failed"
+        except Exception:
+            status = None
+        finally:
+            path = os.path.join("pictures", filename)
+            if os.path.exists(path):
+                os.remove(path)
+        return status, time.monotonic() - started_at
+
+    peak = {'queue_depth': 0, 'in_flight_model_calls': 0}
+    stop = threading.Event()
+
+    def poll_metrics():
+        while not stop.is_set():
+            metrics = requests.get(f"{base_url}/metrics").json()
+            for key in peak:
+                peak[key] = max(peak[key], metrics[key])
+            time.sleep(0.05)
+
+    poller = threading.Thread(target=poll_metrics, daemon=True)
+    poller.start()
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, range(total)))
+    elapsed = time.monotonic() - started_at
+    stop.set()
+    poller.join()
+
+    ok = [t for s, t in results if s == "ok"]
+    failed = [t for s, t in results if s == "failed"]
+    busy = [t for s, t in results if s == 503]
+    other = [s for s, t in results if s not in ("ok", "failed", 503)]
+    print(f"requests: {total}, concurrency: {concurrency}, model delay: {delay}s, elapsed: {elapsed:.2f}s")
+    print(f"analysed: {len(ok)}, failed analysis (200): {len(failed)}, 503: {len(busy)}, other: {len(other)}, "
+          f"throughput: {len(ok) / elapsed:.1f} req/s")
+    print(f"analysed latency p50: {percentile(ok, 0.5):.3f}s, p95: {percentile(ok, 0.95):.3f}s")
+    print(f"503 latency p50: {percentile(busy, 0.5):.3f}s, p95: {percentile(busy, 0.95):.3f}s")
+    print(f"peak queue depth: {peak['queue_depth']}, peak in-flight model calls: {peak['in_flight_model_calls']}")
+    metrics = requests.get(f"{base_url}/metrics").json()
+    print(f"image cache: {metrics['image_cache']}")
+    print(json.dumps(metrics, indent=2))
+
+    # 先等工作线程处理完剩余请求再关闭监听
+    web_server.task_dispatcher.shutdown()
+    web_server.close()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    run_load_test(
+        concurrency=int(args[0]) if len(args) > 0 else 32,
+        total=int(args[1]) if len(args) > 1 else 200,
+        delay=float(args[2]) if len(args) > 2 else 0.5
+    )
@@ -1,5 +1,7 @@
 from api import APIClient
 from agent import ImageAnalysisAgent
+from models.conversation import Conversation, Message
+from serving import WireCacheLRU
 import os
 from typing import List, Dict, Any, Generator, Union
 import json
@@ -27,27 +29,44 @@ def analyze_local_image(image_path: str):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# 只为最近活跃的会话保留格式化缓存，空闲会话由 LRU 释放
+active_sessions = WireCacheLRU()
+
 class ChatSession:
     """对话会话管理类"""
     def __init__(self):
         self.api_client = APIClient()
         self.image_agent = ImageAnalysisAgent(self.api_client)
-        self.conversation_history: List[Dict[str, str]] = []
+        self.conversation = Conversation()
+        self.message_builder = self.api_client.new_message_builder()
+
+    @property
+    def conversation_history(self) -> List[Message]:
+        """对话历史消息列表"""
+        return self.conversation.messages
+
+    def add_message(self, role: str, content: Union[str, List[str]]) -> Message:
+        """添加消息到历史记录，content 可以是工具返回的文本片段列表"""
+        return self.conversation.append(role, content)
 
-    def add_message(self, role: str, content: str) -> None:
-        """添加消息到历史记录"""
-        self.conversation_history.append({
-            'role': role,
-            'content': content
-        })
+    def release_wire(self) -> None:
+        """会话被挤出活跃集合时释放格式化缓存，只在 TextArena 中保留一份文本"""
+        self.message_builder.release()
+        self.conversation.release_wire()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取本会话的前缀缓存命中统计"""
+        return self.message_builder.get_stats()
 
     def handle_response(self) -> Generator[str, None, None]:
         """处理模型响应"""
+        active_sessions.touch(self)
         try:
             print("[DEBUG] Calling llm_chat with tools")
             response = self.api_client.llm_chat(
                 messages=self.conversation_history,
-                tools=self.image_agent.get_tools()
+                tools=self.image_agent.get_tools(),
+                message_builder=self.message_builder
             )
             
             print("[DEBUG] Got response type:", type(response))
@@ -116,12 +135,14 @@ class ChatSession:
                     processing_msg = "正在分析图片...\n" if is_vision else "正在获取天气信息...\n"
                     yield processing_msg
                     
-                    # 处理结果内容
-                    result_content = self._format_tool_result(tool_result["data"])
-                    self.add_message('assistant', result_content)
+                    # 处理结果内容，片段直接写入历史，不再拼接成完整字符串
+                    result_parts = self._tool_result_parts(tool_result["data"])
+                    self.add_message('assistant', result_parts)
                     
                     result_type = "分析结果" if is_vision else "天气信息"
-                    yield f"{result_type}：{result_content}\n"
+                    yield f"{result_type}："
+                    yield from result_parts
+                    yield "\n"
                     
                     # 获取AI补充说明
                     yield from self._get_ai_explanation()
@@ -142,12 +163,14 @@ class ChatSession:
                 processing_msg = "正在分析图片...\n" if is_vision else "正在获取天气信息...\n"
                 yield processing_msg
                 
-                # 处理结果内容
-                result_content = self._format_tool_result(tool_result["data"])
-                self.add_message('assistant', result_content)
+                # 处理结果内容，片段直接写入历史，不再拼接成完整字符串
+                result_parts = self._tool_result_parts(tool_result["data"])
+                self.add_message('assistant', result_parts)
                 
                 result_type = "分析结果" if is_vision else "天气信息"
-                yield f"{result_type}：{result_content}\n"
+                yield f"{result_type}："
+                yield from result_parts
+                yield "\n"
                 
                 # 获取AI补充说明
                 yield from self._get_ai_explanation()
@@ -157,11 +180,11 @@ class ChatSession:
         except Exception as e:
             yield f"工具调用出错: {str(e)}"
 
-    def _format_tool_result(self, data: Union[List[str], Any]) -> str:
-        """格式化工具调用结果"""
+    def _tool_result_parts(self, data: Union[List[str], Any]) -> List[str]:
+        """整理工具调用结果片段"""
         if isinstance(data, list):
-            return "".join(data)
-        return str(data)
+            return [str(part) for part in data]
+        return [str(data)]
 
     def _get_ai_explanation(self) -> Generator[str, None, None]:
         """获取AI补充说明"""
@@ -170,14 +193,24 @@ class ChatSession:
             messages=self.conversation_history + [{
                 'role': 'user',
                 'content': '基于这个结果，你有什么补充说明的吗？'
-            }]
+            }],
+            # 保持与主对话相同的 tools 前缀以命中前缀缓存，但禁止再次调用工具
+            tools=self.image_agent.get_tools(),
+            tool_choice='none',
+            message_builder=self.message_builder
         )
         
-        if isinstance(response, dict) and 'message' in response:
-            if 'content' in response['message']:
-                explanation = response['message']['content']
-                self.add_message('assistant', explanation)
-                yield f"AI助手补充：{explanation}"
+        # llm_chat 返回流式生成器，逐块输出补充说明
+        explanation = []
+        for chunk in response:
+            if isinstance(chunk, str) and chunk:
+                if not explanation:
+                    yield "AI助手补充："
+                explanation.append(chunk)
+                yield chunk
+        
+        if explanation:
+            self.add_message('assistant', "".join(explanation))
 
 def run_chat_session():
     """运行对话会话"""
@@ -203,5 +236,10 @@ def run_chat_session():
         except Exception as e:
             print(f"\n发生错误: {str(e)}")
 
+    active_sessions.discard(session)
+    stats = session.get_cache_stats()
+    print(f"前缀缓存统计: 调用 {stats['calls']} 次, 输入 {stats['input_tokens']} tokens, "
+          f"命中 {stats['cached_tokens']} tokens ({stats['prefix_hit_rate']:.1%}), 前缀变化 {stats['prefix_changes']} 次")
+
 if __name__ == "__main__":
     run_chat_session()
\ No newline at end of file
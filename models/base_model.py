@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Generator
+from .message_builder import format_message
 
 class BaseModel(ABC):
     """基础模型类"""
@@ -20,9 +21,6 @@ class BaseModel(ABC):
         
         formatted_messages = []
         for msg in messages:
-            formatted_messages.append({
-                "role": msg["role"],
-                "content": [{"type": "text", "text": msg["content"]}]
-            })
+            formatted_messages.append(format_message(msg))
             
         return [system_message] + formatted_messages
\ No newline at end of file
@@ -0,0 +1,119 @@
+from typing import Dict, List, Iterable, Iterator, Optional, Union
+import codecs
+import sys
+
+NARROW_ENCODING = 'latin-1'
+WIDE_ENCODING = 'utf-16-le'
+# 直接调用编解码函数，省去 bytes.decode 按名称查找编解码器的开销
+DECODERS = {
+    NARROW_ENCODING: codecs.latin_1_decode,
+    WIDE_ENCODING: codecs.utf_16_le_decode
+}
+
+
+class TextArena:
+    """只追加的文本存储区，消息文本连续存放，消息只保存偏移和长度
+
+    与 Python 字符串一样按内容选择宽度：纯 Latin-1 文本每字符 1 字节，
+    其余（如中文）按 UTF-16 每字符 2 字节存放。
+    """
+    __slots__ = ('_buffer',)
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def append(self, text: Union[str, Iterable[str]]) -> tuple:
+        """追加文本（或文本片段列表），返回 (偏移, 长度, 编码, 文本)"""
+        if not isinstance(text, str):
+            # 片段拼接只是临时对象，写入后即释放
+            text = "".join(str(part) for part in text)
+        encoding = WIDE_ENCODING if text and max(text) > '\xff' else NARROW_ENCODING
+        offset = len(self._buffer)
+        self._buffer += text.encode(encoding, 'surrogatepass')
+        return offset, len(self._buffer) - offset, encoding, text
+
+    def read(self, offset: int, length: int, encoding: str) -> str:
+        """读取文本"""
+        # 通过 memoryview 解码，避免先复制出一段 bytearray；
+        # 视图用完立即释放，否则 bytearray 无法再追加
+        with memoryview(self._buffer) as view, view[offset:offset + length] as chunk:
+            return DECODERS[encoding](chunk, 'surrogatepass')[0]
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+class Message:
+    """紧凑的对话消息，文本存放在 TextArena 中，OpenAI 消息格式按需生成并缓存"""
+    __slots__ = ('role', '_arena', '_offset', '_length', '_encoding', '_wire')
+
+    def __init__(self, role: str, arena: TextArena, offset: int, length: int, encoding: str):
+        self.role = sys.intern(role)
+        self._arena = arena
+        self._offset = offset
+        self._length = length
+        self._encoding = encoding
+        self._wire: Optional[Dict] = None
+
+    @property
+    def content(self) -> str:
+        """消息文本，与缓存的 OpenAI 消息格式共用同一个解码后的字符串"""
+        return self.to_wire()["content"][0]["text"]
+
+    def to_wire(self, text: Optional[str] = None) -> Dict:
+        """转换为 OpenAI 消息格式并缓存；text 为已有的同内容字符串时直接复用，不再解码"""
+        if self._wire is None:
+            if text is None:
+                text = self._arena.read(self._offset, self._length, self._encoding)
+            self._wire = {
+                "role": self.role,
+                "content": [{"type": "text", "text": text}]
+            }
+        return self._wire
+
+    def release_wire(self) -> None:
+        """丢弃缓存的 OpenAI 消息格式，文本仍保存在 TextArena 中"""
+        self._wire = None
+
+    def __getitem__(self, key: str) -> str:
+        # 兼容原先的 {'role': ..., 'content': ...} 字典访问方式
+        if key == 'role':
+            return self.role
+        if key == 'content':
+            return self.content
+        raise KeyError(key)
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, length={self._length})"
+
+
+class Conversation:
+    """对话历史，消息只追加不修改"""
+    __slots__ = ('arena', 'messages')
+
+    def __init__(self):
+        self.arena = TextArena()
+        self.messages: List[Message] = []
+
+    def append(self, role: str, content: Union[str, Iterable[str]]) -> Message:
+        """追加消息，content 可以是工具返回的文本片段列表，无需先拼接"""
+        offset, length, encoding, text = self.arena.append(content)
+        message = Message(role, self.arena, offset, length, encoding)
+        # 活跃会话直接用传入的字符串生成消息格式，释放后再从 TextArena 解码
+        message.to_wire(text)
+        self.messages.append(message)
+        return message
+
+    def release_wire(self) -> None:
+        """会话空闲时丢弃所有消息缓存的 OpenAI 消息格式，下次调用时再从 TextArena 解码"""
+        for message in self.messages:
+            message.release_wire()
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self.messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
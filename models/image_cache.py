@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import struct
+import base64
+import os
+import threading
+
+# 文件头魔数 -> 图片格式
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+]
+
+# ISO BMFF (ftyp) 主品牌 -> 图片格式
+HEIF_BRANDS = {
+    b"heic": "heic", b"heix": "heic", b"hevc": "heic", b"hevx": "heic",
+    b"heim": "heic", b"heis": "heic", b"mif1": "heif", b"msf1": "heif",
+}
+
+# BMP 信息头 (biSize) 的合法长度
+BMP_INFO_HEADER_SIZES = (12, 16, 40, 52, 56, 64, 108, 124)
+
+# 扩展名 -> MIME 子类型
+EXTENSION_ALIASES = {"jpg": "jpeg", "tif": "tiff"}
+
+
+def is_bmp(header: bytes, file_size: Optional[int] = None) -> bool:
+    """校验 14 字节 BMP 文件头及其后的信息头长度，避免把任意以 BM 开头的文件当成 BMP"""
+    if len(header) < 18 or not header.startswith(b"BM"):
+        return False
+    bmp_size, reserved, pixel_offset, info_size = struct.unpack("<IIII", header[2:18])
+    if reserved != 0 or info_size not in BMP_INFO_HEADER_SIZES or pixel_offset < 14 + info_size:
+        return False
+    return file_size is None or bmp_size in (0, file_size)
+
+
+def detect_image_format(header: bytes, file_size: Optional[int] = None) -> Optional[str]:
+    """根据文件头识别图片格式"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header[4:8] == b"ftyp" and header[8:12] in HEIF_BRANDS:
+        return HEIF_BRANDS[header[8:12]]
+    if is_bmp(header, file_size):
+        return "bmp"
+    return None
+
+
+class ImageCache:
+    """图片编码缓存，按 (路径, 修改时间, 大小) 缓存 data URL，按字节数做 LRU 淘汰"""
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_data_url(self, image_path: str) -> str:
+        """获取图片的 data URL，命中缓存时不读取文件内容"""
+        path = os.path.abspath(image_path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            data_url = self._entries.get(key)
+            if data_url is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if data_url is not None:
+            print(f"[DEBUG] Image cache hit: {path}")
+            return data_url
+
+        print(f"[DEBUG] Image cache miss: {path}")
+        with open(path, "rb") as image_file:
+            raw = image_file.read()
+
+        image_format = detect_image_format(raw[:32], len(raw))
+        if image_format is None:
+            # 无法从文件头识别时沿用扩展名，交给模型服务判断
+            image_format = image_path.lower().split('.')[-1]
+            image_format = EXTENSION_ALIASES.get(image_format, image_format)
+            print(f"[DEBUG] Unknown image signature, using extension: {image_format}")
+
+        data_url = f"data:image/{image_format};base64,{base64.b64encode(raw).decode('utf-8')}"
+        with self._lock:
+            self._store(key, data_url)
+        return data_url
+
+    def _store(self, key: Tuple[str, int, int], data_url: str) -> None:
+        """写入缓存并淘汰最久未使用的条目，调用方需持有锁"""
+        size = len(data_url)
+        if size > self.max_bytes:
+            return
+
+        # 同一路径的旧版本已失效，直接移除
+        for stale_key in [k for k in self._entries if k[0] == key[0]]:
+            self.current_bytes -= len(self._entries.pop(stale_key))
+
+        self._entries[key] = data_url
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
@@ -1,4 +1,5 @@
 from .base_model import BaseModel
+from .message_builder import MessageBuilder
 from typing import Dict, List, Any, Generator, Union
 import json
 
@@ -49,16 +50,29 @@ class LanguageModel(BaseModel):
         except Exception as e:
             yield f"Stream processing error: {str(e)}"
 
-    def chat(self, messages: List[Dict[str, Any]], tools: List[Dict] = None) -> Generator[Union[Dict, str], None, None]:
-        """语言模型对话"""
+    def new_message_builder(self) -> MessageBuilder:
+        """为一个会话创建消息构建器"""
+        return MessageBuilder(self.system_prompt)
+
+    def chat(self, messages: List[Dict[str, Any]], tools: List[Dict] = None, tool_choice: str = None,
+             message_builder: MessageBuilder = None) -> Generator[Union[Dict, str], None, None]:
+        """语言模型对话，传入会话的 message_builder 时增量构建消息并记录 token 用量"""
         try:
-            formatted_messages = self.format_messages(messages, self.system_prompt)
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=formatted_messages,
-                tools=tools,
-                stream=True
-            )
+            call = None
+            if message_builder is not None:
+                formatted_messages, call = message_builder.build(messages, tools)
+            else:
+                formatted_messages = self.format_messages(messages, self.system_prompt)
+            request_args = {
+                "model": self.model_name,
+                "messages": formatted_messages,
+                "tools": tools,
+                "stream": True,
+                "stream_options": {"include_usage": True}
+            }
+            if tools and tool_choice:
+                request_args["tool_choice"] = tool_choice
+            completion = self.client.chat.completions.create(**request_args)
             
             # 用于累积工具调用数据
             current_tool_call = None
@@ -66,6 +80,11 @@ class LanguageModel(BaseModel):
             content_buffer = []
             
             for chunk in completion:
+                # 开启 include_usage 后，最后一个 chunk 只携带 usage
+                if not chunk.choices:
+                    if call is not None:
+                        message_builder.record_usage(call, getattr(chunk, 'usage', None))
+                    continue
                 if hasattr(chunk.choices[0], 'delta'):
                     delta = chunk.choices[0].delta
                     print(f"[DEBUG] Processing delta: {delta}")
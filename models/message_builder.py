@@ -0,0 +1,127 @@
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+import hashlib
+import json
+from .conversation import Message
+
+
+def format_message(msg: Any) -> Dict:
+    """转换为 OpenAI 消息格式，Message 对象复用其缓存"""
+    if isinstance(msg, Message):
+        return msg.to_wire()
+    return {
+        "role": msg["role"],
+        "content": [{"type": "text", "text": msg["content"]}]
+    }
+
+
+@lru_cache(maxsize=None)
+def system_message(system_prompt: str) -> Dict:
+    """同一 system prompt 的所有会话共用一个 system 消息"""
+    return {
+        "role": "system",
+        "content": [{"type": "text", "text": system_prompt}]
+    }
+
+
+class MessageBuilder:
+    """会话级增量消息构建器
+
+    每个会话持有一个：复用上次调用已格式化的历史消息，只格式化新增的消息；
+    并按调用记录输入 token 数和服务端前缀缓存命中的 token 数。
+    会话的调用是顺序进行的，构建器不在线程间共享，因此不加锁。
+    """
+    MAX_CALL_HISTORY = 8
+
+    def __init__(self, system_prompt: str):
+        self.system_message = system_message(system_prompt)
+        self.tools: Optional[List[Dict]] = None
+        self.prefix_hash = ""
+        self.prefix_changes = 0
+        self._last_prefix_hash: Optional[str] = None
+        self._sources: List[Any] = []
+        self._formatted: List[Dict] = [self.system_message]
+        self.calls: List[Dict[str, Any]] = []
+        self.call_count = 0
+        self.total_input_tokens = 0
+        self.total_cached_tokens = 0
+        self._update_prefix_hash()
+
+    def _set_tools(self, tools: Optional[List[Dict]]) -> None:
+        """设置工具列表，工具列表变化时重新计算前缀指纹"""
+        if tools is self.tools:
+            return
+        self.tools = tools
+        self._update_prefix_hash()
+
+    def _update_prefix_hash(self) -> None:
+        """计算 system + tools 前缀的指纹，用于判断前缀是否变化"""
+        prefix = json.dumps(self.system_message, ensure_ascii=False)
+        if self.tools:
+            prefix += json.dumps(self.tools, ensure_ascii=False, sort_keys=True)
+        self.prefix_hash = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+
+    def build(self, messages: List[Any], tools: Optional[List[Dict]] = None) -> Tuple[List[Dict], Dict[str, Any]]:
+        """构建消息列表，返回 (消息列表, 本次调用的统计记录)"""
+        self._set_tools(tools)
+        # 与上次调用的前缀指纹不同时，服务端前缀缓存无法命中
+        prefix_changed = self._last_prefix_hash is not None and self._last_prefix_hash != self.prefix_hash
+        if prefix_changed:
+            self.prefix_changes += 1
+            print(f"[DEBUG] Prompt prefix changed: {self._last_prefix_hash[:8]} -> {self.prefix_hash[:8]}")
+        self._last_prefix_hash = self.prefix_hash
+        # Message 对象按身份比较，字典消息按 (role, content) 比较
+        sources = [msg if isinstance(msg, Message) else (msg["role"], msg["content"]) for msg in messages]
+        reused = 0
+        for old, source in zip(self._sources, sources):
+            if old != source:
+                break
+            reused += 1
+
+        del self._sources[reused:]
+        del self._formatted[reused + 1:]
+        for msg, source in zip(messages[reused:], sources[reused:]):
+            self._sources.append(source)
+            self._formatted.append(format_message(msg))
+
+        call = {
+            "prefix_hash": self.prefix_hash,
+            "prefix_changed": prefix_changed,
+            "messages": len(messages),
+            "reused_messages": reused,
+            "input_tokens": 0,
+            "cached_tokens": 0
+        }
+        self.calls.append(call)
+        if len(self.calls) > self.MAX_CALL_HISTORY:
+            del self.calls[0]
+        self.call_count += 1
+        return list(self._formatted), call
+
+    def release(self) -> None:
+        """丢弃已格式化的历史消息，只在会话被挤出活跃集合时调用，不影响前缀统计"""
+        self._sources.clear()
+        del self._formatted[1:]
+
+    def record_usage(self, call: Dict[str, Any], usage: Any) -> None:
+        """把服务端返回的 usage 记到对应调用的统计记录上"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        call["input_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+        call["cached_tokens"] = getattr(details, "cached_tokens", 0) or 0
+        self.total_input_tokens += call["input_tokens"]
+        self.total_cached_tokens += call["cached_tokens"]
+        print(f"[DEBUG] Prompt usage: input_tokens={call['input_tokens']}, cached_tokens={call['cached_tokens']}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取前缀缓存命中统计"""
+        input_tokens = self.total_input_tokens
+        return {
+            "calls": self.call_count,
+            "input_tokens": input_tokens,
+            "cached_tokens": self.total_cached_tokens,
+            "prefix_hit_rate": self.total_cached_tokens / input_tokens if input_tokens else 0.0,
+            "prefix_changes": self.prefix_changes,
+            "recent_calls": list(self.calls)
+        }
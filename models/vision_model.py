@@ -1,7 +1,6 @@
 from .base_model import BaseModel
+from .image_cache import ImageCache
 from typing import Dict, List, Any, Generator
-import base64
-import os
 
 class VisionModel(BaseModel):
     """视觉模型"""
@@ -9,22 +8,7 @@ class VisionModel(BaseModel):
         super().__init__(client)
         self.model_name = "qwen-vl-plus"
         self.system_prompt = "You are a helpful assistant. Answer in Chinese."
-    
-    def encode_image(self, image_path: str) -> str:
-        """Base64编码图片"""
-        try:
-            print(f"[DEBUG] Encoding image from path: {image_path}")
-            # Check if file exists
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Image file not found: {image_path}")
-                
-            with open(image_path, "rb") as image_file:
-                encoded = base64.b64encode(image_file.read()).decode("utf-8")
-                print("[DEBUG] Image encoded successfully")
-                return encoded
-        except Exception as e:
-            print(f"[DEBUG] Error encoding image: {str(e)}")
-            raise
+        self.image_cache = ImageCache()
     
     def chat(self, messages: List[Dict[str, Any]], image_path: str) -> Generator[str, None, None]:
         """视觉模型对话"""
@@ -36,22 +20,18 @@ class VisionModel(BaseModel):
                 image_path = image_path[7:]
                 print(f"[DEBUG] Removed file:// prefix, new path: {image_path}")
             
-            # Verify file exists
-            if not os.path.exists(image_path):
+            # Encode image (cached by path, mtime and size); remote URLs are fetched by the model
+            try:
+                if image_path.startswith(("http://", "https://")):
+                    data_url = image_path
+                    print("[DEBUG] Using remote image URL")
+                else:
+                    data_url = self.image_cache.get_data_url(image_path)
+                    print("[DEBUG] Image encoded successfully")
+            except FileNotFoundError:
                 print(f"[DEBUG] Image file not found: {image_path}")
                 yield f"错误：找不到图片文件 {image_path}"
                 return
-            
-            # Get image format
-            image_format = image_path.lower().split('.')[-1]
-            if image_format == 'jpg':
-                image_format = 'jpeg'
-            print(f"[DEBUG] Image format: {image_format}")
-            
-            # Encode image
-            try:
-                base64_image = self.encode_image(image_path)
-                print("[DEBUG] Image encoded successfully")
             except Exception as e:
                 print(f"[DEBUG] Image encoding failed: {str(e)}")
                 yield f"错误：图片编码失败 - {str(e)}"
@@ -69,7 +49,7 @@ class VisionModel(BaseModel):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/{image_format};base64,{base64_image}"
+                                "url": data_url
                             }
                         },
                         {"type": "text", "text": "请详细描述这张图片的内容。"}
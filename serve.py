@@ -0,0 +1,24 @@
+from waitress import serve
+from web import app, SERVER_MAX_CONCURRENCY, SERVER_MAX_QUEUE
+import os
+
+# 工作线程数需覆盖执行中和排队中的请求，并留出余量用于快速返回 503；
+# 超出的连接由 connection_limit/backlog 限制，不会无限堆积
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", SERVER_MAX_CONCURRENCY + SERVER_MAX_QUEUE + 8))
+CONNECTION_LIMIT = int(os.environ.get("CONNECTION_LIMIT", WORKER_THREADS * 2))
+
+def run(host: str = '0.0.0.0', port: int = 80):
+    """以生产模式启动 web 服务"""
+    print(f"[DEBUG] Serving on {host}:{port} with {WORKER_THREADS} worker threads")
+    serve(
+        app,
+        host=host,
+        port=port,
+        threads=WORKER_THREADS,
+        connection_limit=CONNECTION_LIMIT,
+        backlog=CONNECTION_LIMIT,
+        channel_timeout=120
+    )
+
+if __name__ == '__main__':
+    run(port=int(os.environ.get("PORT", 80)))
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, List, Any, Callable
+import threading
+import time
+
+DEFAULT_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class LatencyHistogram:
+    """请求耗时直方图（秒）"""
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = buckets or DEFAULT_LATENCY_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """记录一次耗时"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出累积分布"""
+        with self._lock:
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+                cumulative += count
+                buckets.append({"le": bound, "count": cumulative})
+            return {"buckets": buckets, "count": self.count, "sum": round(self.total, 6)}
+
+
+class AdmissionController:
+    """并发准入控制：最多 max_concurrency 个请求同时执行，最多 max_queue 个排队，超出直接拒绝"""
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float = 5.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.latency = LatencyHistogram()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """申请执行槽位，队列已满或等待超时返回 False"""
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        return acquired
+
+    def release(self, started_at: float = None) -> None:
+        """释放执行槽位并记录耗时"""
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+        if started_at is not None:
+            self.latency.observe(time.monotonic() - started_at)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前状态"""
+        with self._lock:
+            state = {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "queue_depth": self.waiting,
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected
+            }
+        state["latency_seconds"] = self.latency.snapshot()
+        return state
+
+
+def busy_response():
+    """服务繁忙时的 503 响应"""
+    return {"status": "error", "message": "Server busy, please retry later"}, 503, {"Retry-After": "1"}
+
+
+def admission_required(controller: AdmissionController) -> Callable:
+    """为 Flask 视图函数加上准入控制"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            started_at = time.monotonic()
+            if not controller.acquire():
+                print(f"[DEBUG] Rejected request to {controller.name}: saturated")
+                return busy_response()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(started_at)
+        return wrapper
+    return decorator
+
+
+class WireCacheLRU:
+    """只为最近活跃的 max_active 个会话保留格式化缓存，被挤出的会话调用 release_wire() 释放"""
+    def __init__(self, max_active: int = 256):
+        self.max_active = max_active
+        self.evictions = 0
+        self._sessions: "OrderedDict[int, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, session: Any) -> None:
+        """标记会话为最近活跃，必要时释放最久未活跃会话的缓存"""
+        evicted = []
+        with self._lock:
+            key = id(session)
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_active:
+                evicted.append(self._sessions.popitem(last=False)[1])
+            self.evictions += len(evicted)
+        for idle_session in evicted:
+            idle_session.release_wire()
+
+    def discard(self, session: Any) -> None:
+        """会话结束时移出"""
+        with self._lock:
+            self._sessions.pop(id(session), None)
@@ -1,12 +1,41 @@
-from flask import Flask, request, redirect, url_for, send_from_directory
+from flask import Flask, request, redirect, url_for, send_from_directory, g
 import os
+import time
 from api import APIClient
 from agent import ImageAnalysisAgent
+from serving import AdmissionController, admission_required, busy_response
 
 app = Flask(__name__)
 api_client = APIClient()
 image_agent = ImageAnalysisAgent(api_client)
 
+# 准入控制：整体并发/排队上限，以及 /upload 视觉分析的单独并发上限
+SERVER_MAX_CONCURRENCY = int(os.environ.get("SERVER_MAX_CONCURRENCY", 16))
+SERVER_MAX_QUEUE = int(os.environ.get("SERVER_MAX_QUEUE", 32))
+UPLOAD_MAX_CONCURRENCY = int(os.environ.get("UPLOAD_MAX_CONCURRENCY", 4))
+UPLOAD_MAX_QUEUE = int(os.environ.get("UPLOAD_MAX_QUEUE", 8))
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT", 5))
+
+server_admission = AdmissionController("server", SERVER_MAX_CONCURRENCY, SERVER_MAX_QUEUE, QUEUE_TIMEOUT)
+upload_admission = AdmissionController("upload", UPLOAD_MAX_CONCURRENCY, UPLOAD_MAX_QUEUE, QUEUE_TIMEOUT)
+
+@app.before_request
+def admit_request():
+    # 监控接口和图片静态文件不受准入控制：过载时仍可查看监控，
+    # 外部模型服务回取图片也不会被正在等待它的 /upload 请求堵住
+    if request.endpoint in ('metrics', 'serve_image'):
+        return None
+    g.started_at = time.monotonic()
+    if not server_admission.acquire():
+        return busy_response()
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_request(exc):
+    if g.pop('admitted', False):
+        server_admission.release(g.pop('started_at', None))
+
 baseurl = "http://47.97.8.27"
 imageurl = baseurl + "/image/"
 
@@ -15,12 +44,15 @@ def hello_world():
     return 'Hello, World!'
 
 @app.route('/upload', methods=['POST'])
+@admission_required(upload_admission)
 def upload():
     file = request.files.get('file')
     if file:
         filename = file.filename
-        file.save(os.path.join(os.getcwd(), "pictures", filename))
-        result = image_agent.process(imageurl + filename)
+        image_path = os.path.join(os.getcwd(), "pictures", filename)
+        file.save(image_path)
+        # 传本地路径，由视觉模型读取并编码（经过图片缓存），模型服务无需回取本服务的图片
+        result = image_agent.process(f"file://{image_path}")
         return result
     return {'status': 'error', 'message': 'No file uploaded'}
 
@@ -33,6 +65,21 @@ def getmessage():
 def serve_image(filename):
     return send_from_directory('pictures', filename)
 
+@app.route('/metrics')
+def metrics():
+    server = server_admission.snapshot()
+    upload = upload_admission.snapshot()
+    return {
+        'queue_depth': server['queue_depth'] + upload['queue_depth'],
+        'in_flight_model_calls': api_client.in_flight,
+        'image_cache': api_client.image_cache_stats(),
+        'prompt_cache': api_client.prompt_cache_stats(),
+        'endpoints': {
+            'server': server,
+            'upload': upload
+        }
+    }
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=80)
 